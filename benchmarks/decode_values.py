@@ -0,0 +1,59 @@
+"""
+Микробенчмарк: разбор формы с декодированием при разборе запроса
+против прежнего пути (split по '=' и quopri для каждого значения,
+который вызывался дважды: для вывода в лог и во view).
+
+Запуск из корня проекта: python benchmarks/decode_values.py
+"""
+import os
+import quopri
+import sys
+import timeit
+from urllib.parse import unquote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from e_framework.requests import PostRequests  # noqa: E402
+
+BODIES = {
+    'ascii': 'name=Ivan+Petrov&clinic_name=Central&patient_name=x+y',
+    'cyrillic': ('name=%D0%98%D0%B2%D0%B0%D0%BD+%D0%9F%D0%B5%D1%82%D1%80%D0%BE%D0%B2'
+                 '&clinic_name=%D0%A6%D0%B5%D0%BD%D1%82%D1%80&patient_name=%D0%AF'),
+}
+
+
+def quopri_decode(value):
+    val = bytes(value.replace('%', '=').replace('+', ' '), 'UTF-8')
+    return quopri.decodestring(val).decode('UTF-8')
+
+
+def quopri_path(body):
+    result = {}
+    for item in body.split('&'):
+        k, v = item.split('=')
+        result[k] = v
+    for _ in range(2):
+        decoded = {k: quopri_decode(v) for k, v in result.items()}
+    return decoded
+
+
+def unquote_path(body):
+    pairs = []
+    for item in body.replace('+', ' ').split('&'):
+        k, _, v = item.partition('=')
+        pairs.append((unquote(k), unquote(v)))
+    return dict(pairs)
+
+
+def main(number=20000, repeat=5):
+    for name, body in BODIES.items():
+        assert quopri_path(body) == PostRequests.parse_input_data(body)
+        for label, func in (('quopri x2', quopri_path),
+                            ('unquote x1', unquote_path),
+                            ('C x1', PostRequests.parse_input_data)):
+            best = min(timeit.repeat(lambda: func(body), number=number, repeat=repeat))
+            print(f'{name:10} {label:12} {best / number * 1e6:6.2f} мкс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Память доменной модели: 1M пациентов, 100k клиник и 1M записей
+пациентов в клиники (по умолчанию).
+
+Запуск из корня проекта:
+    python benchmarks/memory_domain.py [--rss] [пациенты] [клиники] [записи]
+tracemalloc сам расходует память, поэтому пиковый RSS честно измеряется
+только отдельным запуском с --rss (без tracemalloc).
+"""
+import os
+import resource
+import sys
+import tracemalloc
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patterns.creational_patterns import Engine  # noqa: E402
+
+
+def build(patients, clinics, links):
+    engine = Engine()
+    location = engine.add_location('Город')
+    for i in range(clinics):
+        engine.add_clinic('state' if i % 2 else 'private', f'clinic_{i}', location)
+    for i in range(patients):
+        engine.add_patient(f'patient_{i}')
+    for i in range(links):
+        engine.membership.add(engine.clinics[i % clinics], engine.patients[i % patients])
+    return engine
+
+
+def main(patients=1_000_000, clinics=100_000, links=1_000_000, rss=False):
+    if not rss:
+        tracemalloc.start()
+    started = perf_counter()
+    engine = build(patients, clinics, links)
+    elapsed = perf_counter() - started
+    print(f'{len(engine.patients)} пациентов, {len(engine.clinics)} клиник, '
+          f'{len(engine.membership.edge_clinic)} записей за {elapsed:.1f} с')
+    if rss:
+        # ru_maxrss в Linux - в килобайтах
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(f'пиковый RSS: {max_rss / 1024:.0f} МБ')
+    else:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'tracemalloc: {current / 2 ** 20:.0f} МБ')
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    rss = '--rss' in args
+    main(*(int(arg) for arg in args if arg != '--rss'), rss=rss)
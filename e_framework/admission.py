@@ -0,0 +1,127 @@
+from collections import OrderedDict
+from threading import Condition, Lock
+from time import monotonic, time
+
+# задержка в очереди больше часа считается ошибкой заголовка
+MAX_QUEUE_DELAY = 3600
+
+
+class TooManyRequests(Exception):
+    """Исключение, которым фронт сообщает фреймворку о превышении лимита."""
+
+    def __init__(self, retry_after=1):
+        self.retry_after = retry_after
+        super().__init__(f'Too many requests, retry after {retry_after} s')
+
+
+class AdmissionControl:
+    """
+    Контроль допуска запросов: ограничивает число одновременно
+    обрабатываемых запросов и время ожидания в очереди.
+    Лишние запросы сразу получают 503 с заголовком Retry-After.
+    """
+
+    def __init__(self, max_concurrency=8, max_queue_delay=0.5,
+                 priorities=None, default_priority=0.5, retry_after=1):
+        """
+        :param max_concurrency: максимум запросов в обработке
+        :param max_queue_delay: максимальное ожидание в очереди, секунды
+        :param priorities: доля max_concurrency, доступная методу запроса
+        :param default_priority: доля для методов, отсутствующих в priorities
+        :param retry_after: значение заголовка Retry-After, секунды
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue_delay = max_queue_delay
+        self.priorities = priorities if priorities is not None else {'GET': 1.0}
+        self.default_priority = default_priority
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+        self.condition = Condition()
+
+    def get_limit(self, request):
+        share = self.priorities.get(request['method'], self.default_priority)
+        return max(1, int(self.max_concurrency * share))
+
+    @staticmethod
+    def get_queue_delay(environ):
+        # время, проведённое запросом в очереди балансировщика по заголовку
+        # X-Request-Start ('t=...' или число); единица определяется по величине:
+        # секунды (nginx ${msec}), миллисекунды или микросекунды
+        request_start = environ.get('HTTP_X_REQUEST_START')
+        if not request_start:
+            return 0
+        try:
+            started = float(request_start.strip().removeprefix('t='))
+        except ValueError:
+            return 0
+        if started > 1e14:
+            started /= 1e6
+        elif started > 1e11:
+            started /= 1e3
+        delay = time() - started
+        # отрицательные (рассинхрон часов) и неправдоподобные значения игнорируются
+        if delay < 0 or delay > MAX_QUEUE_DELAY:
+            return 0
+        return delay
+
+    def admit(self, request, environ):
+        """Возвращает True, если запрос можно обрабатывать."""
+        queue_delay = self.get_queue_delay(environ)
+        limit = self.get_limit(request)
+        deadline = monotonic() + self.max_queue_delay - queue_delay
+        with self.condition:
+            while self.in_flight >= limit:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    return False
+                self.condition.wait(remaining)
+            if monotonic() > deadline:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            # будятся все: у ожидающих разные лимиты, и первым в очереди
+            # может оказаться запрос, которому освободившегося слота мало
+            self.condition.notify_all()
+
+
+class TokenBucket:
+    """Ограничение частоты запросов для каждого клиента (token bucket)."""
+
+    def __init__(self, rate=10, capacity=20, max_clients=10000):
+        """
+        :param rate: пополнение корзины, токенов в секунду
+        :param capacity: ёмкость корзины (допустимый всплеск)
+        :param max_clients: сколько клиентов хранить одновременно;
+            сверх этого вытесняются давно не обращавшиеся клиенты
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.max_clients = max_clients
+        # порядок - от давно не обращавшихся клиентов к недавним (LRU)
+        self.buckets = OrderedDict()
+        self.lock = Lock()
+
+    def consume(self, client):
+        """Списывает токен; возвращает 0 или число секунд до следующего токена."""
+        now = monotonic()
+        with self.lock:
+            tokens, last = self.buckets.get(client, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self.buckets[client] = (tokens - 1, now)
+                self.buckets.move_to_end(client)
+                # O(1) на запрос: вытесняется дольше всех молчавший клиент,
+                # его корзина успела пополниться больше остальных
+                while len(self.buckets) > self.max_clients:
+                    self.buckets.popitem(last=False)
+                return 0
+            self.buckets[client] = (tokens, now)
+            self.buckets.move_to_end(client)
+            return (1 - tokens) / self.rate
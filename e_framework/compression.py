@@ -0,0 +1,182 @@
+import gzip
+import zlib
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+from time import thread_time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Compression:
+    """
+    Сжатие ответов по заголовку Accept-Encoding (br, gzip, deflate).
+    Целые ответы сжимаются один раз и кэшируются по хэшу содержимого,
+    потоковые ответы (итератор фрагментов) сжимаются по мере отдачи,
+    каждый фрагмент сразу сбрасывается клиенту (sync flush).
+    Для каждого маршрута считаются все ответы, в том числе несжатые:
+    байты до и после сжатия и время CPU.
+    """
+
+    def __init__(self, min_size=1024, level=6,
+                 content_types=('text/html', 'text/css', 'text/plain',
+                                'application/json', 'application/javascript'),
+                 cache_size=256):
+        """
+        :param min_size: ответы меньшего размера (байт) не сжимаются
+        :param level: уровень сжатия gzip/deflate (1-9)
+        :param content_types: типы содержимого, которые сжимаются
+        :param cache_size: сколько сжатых тел хранить в кэше
+        """
+        self.min_size = min_size
+        self.level = level
+        self.content_types = set(content_types)
+        self.cache_size = cache_size
+        self.encodings = ('br', 'gzip', 'deflate') if brotli else ('gzip', 'deflate')
+        self.cache = OrderedDict()
+        self.stats = {}
+        self.lock = Lock()
+
+    def choose_encoding(self, accept_encoding):
+        """Лучшая из поддерживаемых кодировок, разрешённых клиентом, или None."""
+        if not accept_encoding:
+            return None
+        weights = {}
+        for item in accept_encoding.split(','):
+            coding, _, params = item.strip().partition(';')
+            q = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            weights[coding.strip().lower()] = q
+        best, best_q = None, 0.0
+        for coding in self.encodings:
+            q = weights.get(coding, weights.get('*', 0.0))
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data)
+        if encoding == 'gzip':
+            return gzip.compress(data, compresslevel=self.level, mtime=0)
+        return zlib.compress(data, self.level)
+
+    def compressor(self, encoding):
+        """Функции сжатия фрагмента, сброса накопленных данных и завершения."""
+        if encoding == 'br':
+            compressor = brotli.Compressor()
+            return compressor.process, compressor.flush, compressor.finish
+        # wbits: 31 - формат gzip, 15 - zlib (HTTP deflate)
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED,
+                                      31 if encoding == 'gzip' else 15)
+        return (compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+                compressor.flush)
+
+    def get_cached(self, data, encoding):
+        key = (encoding, blake2b(data, digest_size=16).digest())
+        with self.lock:
+            compressed = self.cache.get(key)
+            if compressed is not None:
+                self.cache.move_to_end(key)
+                return compressed
+        compressed = self.compress(data, encoding)
+        with self.lock:
+            self.cache[key] = compressed
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return compressed
+
+    def count(self, path, raw, sent, seconds):
+        with self.lock:
+            stats = self.stats.setdefault(path, [0, 0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += raw
+            stats[2] += sent
+            stats[3] += seconds
+
+    def apply(self, environ, path, headers, body):
+        """
+        Дополняет заголовки и возвращает тело ответа для WSGI.
+        body - bytes или итератор фрагментов bytes.
+        """
+        content_type = dict(headers).get('Content-Type', '').partition(';')[0]
+        if content_type not in self.content_types:
+            return self.plain(path, headers, body)
+
+        headers.append(('Vary', 'Accept-Encoding'))
+        encoding = self.choose_encoding(environ.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return self.plain(path, headers, body)
+
+        if isinstance(body, bytes):
+            if len(body) < self.min_size:
+                return self.plain(path, headers, body)
+            started = thread_time()
+            compressed = self.get_cached(body, encoding)
+            self.count(path, len(body), len(compressed), thread_time() - started)
+            headers.append(('Content-Encoding', encoding))
+            headers.append(('Content-Length', str(len(compressed))))
+            return [compressed]
+
+        headers.append(('Content-Encoding', encoding))
+        return self.stream(path, body, encoding)
+
+    def plain(self, path, headers, body):
+        """Ответ без сжатия; учитывается в статистике с коэффициентом 1."""
+        if isinstance(body, bytes):
+            self.count(path, len(body), len(body), 0.0)
+            headers.append(('Content-Length', str(len(body))))
+            return [body]
+        return self.passthrough(path, body)
+
+    def passthrough(self, path, chunks):
+        sent = 0
+        try:
+            for chunk in chunks:
+                sent += len(chunk)
+                yield chunk
+        finally:
+            self.count(path, sent, sent, 0.0)
+
+    def stream(self, path, chunks, encoding):
+        process, flush, finish = self.compressor(encoding)
+        raw = sent = 0
+        seconds = 0.0
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                started = thread_time()
+                # фрагмент отдаётся клиенту сразу, а не копится в компрессоре
+                data = process(chunk) + flush()
+                seconds += thread_time() - started
+                raw += len(chunk)
+                if data:
+                    sent += len(data)
+                    yield data
+            started = thread_time()
+            data = finish()
+            seconds += thread_time() - started
+            sent += len(data)
+            yield data
+        finally:
+            self.count(path, raw, sent, seconds)
+
+    def report(self):
+        """Строки отчёта: запросы, байты до/после сжатия и CPU по маршрутам."""
+        with self.lock:
+            stats = sorted(self.stats.items())
+        lines = []
+        for path, (requests, raw, sent, seconds) in stats:
+            ratio = sent / raw if raw else 1
+            lines.append(f'{path}: {requests} отв., {raw} -> {sent} байт '
+                         f'({ratio:.0%}), CPU {seconds * 1000:.1f} мс')
+        return lines
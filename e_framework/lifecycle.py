@@ -0,0 +1,18 @@
+import resource
+
+
+def memory_usage():
+    """
+    Память текущего процесса в КБ: (RSS, приватная часть RSS).
+    Приватная часть известна только в Linux (/proc/self/smaps_rollup);
+    разница между ними - страницы, общие с главным процессом после fork.
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        # ru_maxrss - пиковое значение; в Linux в КБ, в macOS в байтах
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, None
+    rss = int(fields['Rss'].split()[0])
+    private = int(fields['Private_Clean'].split()[0]) + int(fields['Private_Dirty'].split()[0])
+    return rss, private
@@ -1,4 +1,9 @@
-import quopri
+import gc
+import sys
+from contextlib import ExitStack
+from math import ceil
+from .admission import TooManyRequests
+from .middleware import compile_chain
 from .requests import GetRequests, PostRequests
 
 
@@ -7,12 +12,113 @@ class PageNotFound404:
         return '404 WHAT', '404 Page not found'
 
 
+class ClosingIterator:
+    """
+    Потоковое тело ответа, которое держит ресурсы запроса (слот admission,
+    UnitOfWork) до close(): тело контроллера-генератора выполняется уже
+    после возврата из Framework, во время отдачи ответа сервером.
+    """
+
+    def __init__(self, iterable, resources):
+        self.iterable = iterable
+        self.iterator = iter(iterable)
+        self.resources = resources
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            raise
+        except BaseException:
+            # ошибка при отдаче тела откатывает UnitOfWork
+            resources, self.resources = self.resources, None
+            if resources is not None:
+                resources.__exit__(*sys.exc_info())
+            raise
+
+    def close(self):
+        try:
+            close = getattr(self.iterable, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            resources, self.resources = self.resources, None
+            if resources is not None:
+                resources.close()
+
+
 class Framework:
     """Класс Framework - основа фреймворка"""
 
-    def __init__(self, routes_obj, fronts_obj):
+    # методы, для которых цепочки фронтов собираются при старте
+    methods = ('GET', 'POST', 'HEAD')
+
+    def __init__(self, routes_obj, fronts_obj, unit_of_work=None, admission=None,
+                 compression=None):
         self.routes_lst = routes_obj
         self.fronts_lst = fronts_obj
+        # класс UnitOfWork, открывающий отдельную транзакцию на каждый запрос
+        self.unit_of_work = unit_of_work
+        # AdmissionControl, отсекающий запросы при перегрузке
+        self.admission = admission
+        # Compression, сжимающий ответы по Accept-Encoding
+        self.compression = compression
+        self.not_found = PageNotFound404()
+        self.handlers = {}
+        for path in [*self.routes_lst, None]:
+            for method in self.methods:
+                self.get_handler(path, method)
+        # хуки жизненного цикла приложения
+        self.startup_hooks = []
+        self.worker_hooks = []
+        self.shutdown_hooks = []
+
+    def on_startup(self, func):
+        """Хук прогрева: выполняется в главном процессе до fork."""
+        self.startup_hooks.append(func)
+        return func
+
+    def on_worker_start(self, func):
+        """Хук воркера: выполняется в каждом процессе после fork."""
+        self.worker_hooks.append(func)
+        return func
+
+    def on_shutdown(self, func):
+        self.shutdown_hooks.append(func)
+        return func
+
+    def warm_up(self):
+        for hook in self.startup_hooks:
+            hook()
+        # всё созданное к этому моменту исключается из сборки мусора:
+        # сборщик не пишет в заголовки этих объектов, и после fork
+        # их страницы остаются общими между воркерами (copy-on-write)
+        gc.collect()
+        gc.freeze()
+
+    def start_worker(self):
+        for hook in self.worker_hooks:
+            hook()
+
+    def shutdown(self):
+        for hook in reversed(self.shutdown_hooks):
+            hook()
+
+    def get_handler(self, path, method):
+        """Контроллер вместе с подходящими ему фронтами."""
+        if path not in self.routes_lst:
+            path = None
+        key = (path, method)
+        handler = self.handlers.get(key)
+        if handler is None:
+            view = self.routes_lst[path] if path is not None else self.not_found
+            handler = compile_chain(view, self.fronts_lst, path, method)
+            if method in self.methods:
+                self.handlers[key] = handler
+        return handler
 
     def __call__(self, environ, start_response):
         path = environ['PATH_INFO']
@@ -23,42 +129,77 @@ class Framework:
         request = {}
         method = environ['REQUEST_METHOD']
         request['method'] = method
+        request['client'] = environ.get('REMOTE_ADDR')
+
+        # ресурсы запроса освобождаются, когда тело ответа отдано:
+        # для потокового тела - при его close()
+        with ExitStack() as resources:
+            if self.admission is not None:
+                if not self.admission.admit(request, environ):
+                    return self.reject(start_response, '503 Service Unavailable',
+                                       self.admission.retry_after)
+                resources.callback(self.admission.release)
+            body = self.handle(path, request, environ, start_response, resources)
+            if isinstance(body, list):
+                return body
+            return ClosingIterator(body, resources.pop_all())
+
+    def handle(self, path, request, environ, start_response, resources):
+        method = request['method']
 
         if method == 'POST':
             data = PostRequests().get_request_params(environ)
             request['data'] = data
-            print(f'Получен POST-запрос: {Framework.decode_value(data)}')
+            print(f'Получен POST-запрос: {data}')
         if method == 'GET':
             request_params = GetRequests().get_request_params(environ)
             request['request_params'] = request_params
             print(f'Параметры GET-запроса: {request_params}')
 
-        if path in self.routes_lst:
-            view = self.routes_lst[path]
+        handler = self.get_handler(path, method)
+
+        try:
+            with ExitStack() as scope:
+                if self.unit_of_work:
+                    scope.enter_context(self.unit_of_work.scope())
+                response = handler(request)
+                if not isinstance(response[1], str):
+                    # UnitOfWork потокового ответа фиксируется после его отдачи
+                    resources.push(scope.pop_all())
+        except TooManyRequests as e:
+            return self.reject(start_response, '429 Too Many Requests', e.retry_after)
+
+        # контроллер возвращает (код, тело) или (код, тело, тип содержимого);
+        # тело - строка или итератор строк для потоковой отдачи
+        code, body, *content_type = response
+        headers = [('Content-Type', content_type[0] if content_type else 'text/html')]
+        if isinstance(body, str):
+            body = body.encode('utf-8')
         else:
-            view = PageNotFound404()
-
-        for front in self.fronts_lst:
-            front(request)
+            body = (chunk.encode('utf-8') for chunk in body)
 
-        code, body = view(request)
-        start_response(code, [('Content-Type', 'text/html')])
-        return [body.encode('utf-8')]
+        if self.compression:
+            route = path if path in self.routes_lst else '404'
+            body = self.compression.apply(environ, route, headers, body)
+        elif isinstance(body, bytes):
+            headers.append(('Content-Length', str(len(body))))
+            body = [body]
+        start_response(code, headers)
+        return body
 
     @staticmethod
-    def decode_value(data):
-        new_data = {}
-        for k, v in data.items():
-            val = bytes(v.replace('%', '=').replace("+", " "), 'UTF-8')
-            val_decode_str = quopri.decodestring(val).decode('UTF-8')
-            new_data[k] = val_decode_str
-        return new_data
+    def reject(start_response, code, retry_after):
+        start_response(code, [('Content-Type', 'text/html'),
+                              ('Retry-After', str(max(1, ceil(retry_after))))])
+        return [code.encode('utf-8')]
 
 
 class DebugApplication(Framework):
-    def __init__(self, routes_obj, fronts_obj):
-        self.application = Framework(routes_obj, fronts_obj)
-        super().__init__(routes_obj, fronts_obj)
+    def __init__(self, routes_obj, fronts_obj, unit_of_work=None, admission=None,
+                 compression=None):
+        self.application = Framework(routes_obj, fronts_obj, unit_of_work, admission,
+                                     compression)
+        super().__init__(routes_obj, fronts_obj, unit_of_work, admission, compression)
 
     def __call__(self, env, start_response):
         print('DEBUG MODE')
@@ -67,9 +208,11 @@ class DebugApplication(Framework):
 
 
 class FakeApplication(Framework):
-    def __init__(self, routes_obj, fronts_obj):
-        self.application = Framework(routes_obj, fronts_obj)
-        super().__init__(routes_obj, fronts_obj)
+    def __init__(self, routes_obj, fronts_obj, unit_of_work=None, admission=None,
+                 compression=None):
+        self.application = Framework(routes_obj, fronts_obj, unit_of_work, admission,
+                                     compression)
+        super().__init__(routes_obj, fronts_obj, unit_of_work, admission, compression)
 
     def __call__(self, env, start_response):
         start_response('200 OK', [('Content-Type', 'text/html')])
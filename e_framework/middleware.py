@@ -0,0 +1,56 @@
+class Front:
+    """
+    Декоратор фронт-контроллера: ограничивает его маршрутами и методами
+    и задаёт, выполняется он до или после контроллера.
+
+    Фронт "до" вызывается как front(request); если он вернёт (code, body),
+    контроллер не вызывается, и этот ответ отдаётся как есть - фронты
+    "после" для него тоже не вызываются. Фронт "после" вызывается как
+    front(request, response) и возвращает ответ.
+    """
+
+    def __init__(self, routes=None, methods=None, after=False):
+        self.routes = routes
+        self.methods = methods
+        self.after = after
+
+    def __call__(self, func):
+        func.routes = self.routes
+        func.methods = self.methods
+        func.after = self.after
+        return func
+
+
+def applies_to(front, path, method):
+    routes = getattr(front, 'routes', None)
+    methods = getattr(front, 'methods', None)
+    if routes is not None and path not in routes:
+        return False
+    if methods is not None and method not in methods:
+        return False
+    return True
+
+
+def compile_chain(view, fronts, path, method):
+    """
+    Собирает цепочку фронтов для пары (маршрут, метод) один раз.
+    Если ни один фронт не подходит, возвращается сам контроллер.
+    """
+    selected = [front for front in fronts if applies_to(front, path, method)]
+    before = tuple(front for front in selected if not getattr(front, 'after', False))
+    after = tuple(front for front in selected if getattr(front, 'after', False))
+
+    if not before and not after:
+        return view
+
+    def chain(request):
+        for front in before:
+            response = front(request)
+            if response is not None:
+                return response
+        response = view(request)
+        for front in after:
+            response = front(request, response)
+        return response
+
+    return chain
@@ -1,15 +1,60 @@
+import codecs
+from urllib.parse import unquote_to_bytes
+
+
+class RequestParams(dict):
+    """
+    Параметры запроса, уже декодированные из URL-кодировки.
+    По ключу доступно последнее значение, все значения - через getlist.
+    """
+
+    def __init__(self, pairs=()):
+        super().__init__()
+        self.lists = {}
+        for k, v in pairs:
+            self[k] = v
+            self.lists.setdefault(k, []).append(v)
+
+    def getlist(self, key):
+        return self.lists.get(key, [])
+
+
+def unquote_value(value: str) -> str:
+    """
+    То же, что urllib.parse.unquote, но %XX разбираются на C:
+    %XX превращаются в \\xXX для codecs.escape_decode, а обратная косая
+    черта экранируется заранее, поэтому других escape-последовательностей
+    в строке нет.
+    """
+    if '%' not in value:
+        return value
+    try:
+        data = codecs.escape_decode(
+            value.replace('\\', '\\\\').replace('%', '\\x').encode('utf-8'))[0]
+    except ValueError:
+        # некорректная последовательность (%2, %zz) остаётся как есть
+        data = unquote_to_bytes(value)
+    return data.decode('utf-8', 'replace')
+
+
+def parse_input_data(data: str):
+    # URL-декодирование выполняется один раз, при разборе запроса
+    pairs = []
+    if data:
+        for item in data.replace('+', ' ').split('&'):
+            if not item:
+                continue
+            k, _, v = item.partition('=')
+            pairs.append((unquote_value(k), unquote_value(v)))
+    return RequestParams(pairs)
+
+
 class GetRequests:
     """Класс для обработки GET-запросов."""
 
     @staticmethod
     def parse_input_data(data: str):
-        result = {}
-        if data:
-            params = data.split('&')
-            for item in params:
-                k, v = item.split('=')
-                result[k] = v
-        return result
+        return parse_input_data(data)
 
     @staticmethod
     def get_request_params(environ):
@@ -23,13 +68,7 @@ class PostRequests:
 
     @staticmethod
     def parse_input_data(data: str):
-        result = {}
-        if data:
-            params = data.split('&')
-            for item in params:
-                k, v = item.split('=')
-                result[k] = v
-        return result
+        return parse_input_data(data)
 
     @staticmethod
     def get_wsgi_input_data(env) -> bytes:
@@ -39,7 +78,7 @@ class PostRequests:
         return data
 
     def parse_wsgi_input_data(self, data: bytes) -> dict:
-        result = {}
+        result = RequestParams()
         if data:
             data_str = data.decode(encoding='utf-8')
             result = self.parse_input_data(data_str)
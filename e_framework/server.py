@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer
+
+
+class ThreadPoolWSGIServer(WSGIServer):
+    """
+    WSGI-сервер с ограниченным пулом потоков. В отличие от ThreadingMixIn
+    (новый поток на каждый запрос) потоки переиспользуются, поэтому
+    открытые в них ресурсы (sqlite-соединения) живут до остановки сервера.
+    Пул создаётся при первом запросе - уже в воркере после fork.
+    """
+
+    pool_size = 16
+
+    def __init__(self, *args, **kwargs):
+        self.pool = None
+        super().__init__(*args, **kwargs)
+
+    def process_request(self, request, client_address):
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(self.pool_size, thread_name_prefix='request')
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def close_pool(self):
+        """Дожидается запросов в обработке; ещё не начатые отбрасываются."""
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
@@ -0,0 +1,36 @@
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from .templator import fragment_cache
+
+
+class FragmentCacheExtension(Extension):
+    """
+    {% cache key, ttl %} ... {% endcache %}
+
+    key - строка-тег или кортеж (тег, значения контекста...),
+    ttl - время жизни фрагмента в секундах.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        parser.stream.expect('comma')
+        ttl = parser.parse_expression()
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cache', [key, ttl]),
+                               [], [], body).set_lineno(lineno)
+
+    @staticmethod
+    def _cache(key, ttl, caller):
+        if not isinstance(key, tuple):
+            key = (key,)
+        value = fragment_cache.get(key)
+        if value is None:
+            # поколение читается до рендера, чтобы не сохранить
+            # фрагмент по данным, изменённым во время рендера
+            generation = fragment_cache.generation(key[0])
+            value = caller()
+            fragment_cache.set(key, value, ttl, generation)
+        return value
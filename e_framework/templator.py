@@ -1,4 +1,88 @@
-from jinja2 import Environment, FileSystemLoader
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from time import monotonic
+
+
+class FragmentCache:
+    """
+    Ограниченный LRU-кэш отрендеренных фрагментов шаблонов.
+    Ключ фрагмента - (тег, значения из контекста); по тегу фрагменты
+    сбрасываются изменяющими данные контроллерами.
+    Сброс увеличивает поколение тега: фрагмент, отрендеренный до сброса,
+    но сохраняемый после него, в кэш не попадает.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.fragments = OrderedDict()
+        self.generations = {}
+        self.lock = Lock()
+
+    def generation(self, tag):
+        with self.lock:
+            return self.generations.get(tag, 0)
+
+    def get(self, key):
+        with self.lock:
+            item = self.fragments.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < monotonic():
+                del self.fragments[key]
+                return None
+            self.fragments.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, generation=None):
+        with self.lock:
+            if generation is not None and self.generations.get(key[0], 0) != generation:
+                # тег сброшен, пока фрагмент рендерился
+                return
+            self.fragments[key] = (monotonic() + ttl, value)
+            self.fragments.move_to_end(key)
+            if len(self.fragments) > self.maxsize:
+                self.fragments.popitem(last=False)
+
+    def invalidate(self, *tags):
+        with self.lock:
+            for tag in tags:
+                self.generations[tag] = self.generations.get(tag, 0) + 1
+            for key in [key for key in self.fragments if key[0] in tags]:
+                del self.fragments[key]
+
+    def clear(self):
+        with self.lock:
+            self.fragments.clear()
+
+
+fragment_cache = FragmentCache()
+
+
+def invalidate(*tags):
+    """Сбрасывает кэшированные фрагменты с указанными тегами."""
+    fragment_cache.invalidate(*tags)
+
+
+@lru_cache(maxsize=None)
+def get_environment(folder):
+    # окружение создаётся один раз на папку, чтобы jinja2
+    # кэшировала скомпилированные шаблоны между запросами;
+    # сам jinja2 импортируется только при первом рендере
+    from jinja2 import Environment, FileSystemLoader
+    from .template_extensions import FragmentCacheExtension
+
+    env = Environment(extensions=[FragmentCacheExtension])
+    env.loader = FileSystemLoader(folder)
+    return env
+
+
+def precompile(folder='templates'):
+    """Загружает и компилирует все шаблоны папки заранее (до fork)."""
+    env = get_environment(folder)
+    for template_name in env.list_templates(extensions=['html']):
+        env.get_template(template_name)
 
 
 def render(template_name, folder='templates', **kwargs):
@@ -9,7 +93,6 @@ def render(template_name, folder='templates', **kwargs):
     :return:
     """
 
-    env = Environment()
-    env.loader = FileSystemLoader(folder)
+    env = get_environment(folder)
     template = env.get_template(template_name)
     return template.render(**kwargs)
@@ -1,14 +1,25 @@
-import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class UnitOfWorkNotStartedException(LookupError):
+    def __init__(self):
+        super().__init__('UnitOfWork is not started: open UnitOfWork.scope() '
+                         'or pass UnitOfWork to Framework')
 
 
 # Архитектурный системный паттерн - Unit of work
 class UnitOfWork:
-    current = threading.local()
+    # текущий UnitOfWork привязан к потоку / async-контексту запроса
+    current = ContextVar('unit_of_work')
+    mapper_registry = None
 
     def __init__(self):
         self.new_objects = []
         self.dirty_objects = []
         self.removed_objects = []
+        self.commit_hooks = []
+        self.MapperRegistry = __class__.mapper_registry
 
     def set_mapper_registry(self, mapper_registry):
         self.MapperRegistry = mapper_registry
@@ -22,14 +33,28 @@ class UnitOfWork:
     def register_removed(self, obj):
         self.removed_objects.append(obj)
 
+    def on_commit(self, func):
+        """Действие, выполняемое только после успешной записи в БД."""
+        self.commit_hooks.append(func)
+
     def commit(self):
         self.insert_new()
         self.update_dirty()
         self.delete_removed()
 
+        hooks = list(self.commit_hooks)
+        self.clear()
+        for hook in hooks:
+            hook()
+
+    def rollback(self):
+        self.clear()
+
+    def clear(self):
         self.new_objects.clear()
         self.dirty_objects.clear()
         self.removed_objects.clear()
+        self.commit_hooks.clear()
 
     def insert_new(self):
         print(self.new_objects)
@@ -47,18 +72,57 @@ class UnitOfWork:
 
     @staticmethod
     def new_current():
-        __class__.set_current(UnitOfWork())
+        return __class__.set_current(UnitOfWork())
 
     @classmethod
     def set_current(cls, unit_of_work):
-        cls.current.unit_of_work = unit_of_work
+        return cls.current.set(unit_of_work)
 
     @classmethod
     def get_current(cls):
-        return cls.current.unit_of_work
+        try:
+            return cls.current.get()
+        except LookupError:
+            raise UnitOfWorkNotStartedException() from None
+
+    @classmethod
+    def set_default_mapper_registry(cls, mapper_registry):
+        cls.mapper_registry = mapper_registry
+
+    @classmethod
+    @contextmanager
+    def scope(cls, join=False):
+        """
+        Открывает новый UnitOfWork на время запроса:
+        фиксирует изменения при успехе и откатывает при ошибке.
+        С join=True присоединяется к уже открытому UnitOfWork (его
+        зафиксирует внешний scope) и открывает свой, только если его нет.
+        """
+        if join:
+            unit_of_work = cls.current.get(None)
+            if unit_of_work is not None:
+                yield unit_of_work
+                return
+        token = cls.new_current()
+        unit_of_work = cls.get_current()
+        try:
+            yield unit_of_work
+        except BaseException:
+            unit_of_work.rollback()
+            raise
+        else:
+            try:
+                unit_of_work.commit()
+            except BaseException:
+                unit_of_work.rollback()
+                raise
+        finally:
+            cls.current.reset(token)
 
 
 class DomainObject:
+    __slots__ = ()
+
     def mark_new(self):
         UnitOfWork.get_current().register_new(self)
 
@@ -1,4 +1,3 @@
-import jsonpickle
 from e_framework.templator import render
 
 
@@ -9,8 +8,17 @@ class Observer:
 
 
 class Subject:
-    def __init__(self):
-        self.observers = []
+    # наблюдатели регистрируются на класс (тип субъекта), а не на экземпляр
+    __slots__ = ()
+    observers = []
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.observers = []
+
+    @classmethod
+    def attach(cls, observer):
+        cls.observers.append(observer)
 
     def notify(self):
         for item in self.observers:
@@ -19,23 +27,26 @@ class Subject:
 
 class SmsNotifier(Observer):
     def update(self, subject):
-        print('SMS->', 'к нам присоединился', subject.patients[-1].name)
+        print('SMS->', 'к нам присоединился', subject.last_patient.name)
 
 
 class EmailNotifier(Observer):
     def update(self, subject):
-        print(('EMAIL->', 'к нам присоединился', subject.patients[-1].name))
+        print(('EMAIL->', 'к нам присоединился', subject.last_patient.name))
 
 
 class BaseSerializer:
     def __init__(self, obj):
         self.obj = obj
 
+    # jsonpickle импортируется только при первой сериализации
     def save(self):
+        import jsonpickle
         return jsonpickle.dumps(self.obj)
 
     @staticmethod
     def load(data):
+        import jsonpickle
         return jsonpickle.loads(data)
 
 
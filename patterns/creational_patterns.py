@@ -1,30 +1,204 @@
 import copy
-import quopri
+import os
 import sqlite3
+import threading
+from array import array
 
 from .behavioral_patterns import ConsoleWriter, Subject
 from .architectural_system_pattern_unit_of_work import DomainObject
 
-connection = sqlite3.connect('patterns.sqlite')
+connections = threading.local()
+# все соединения процесса, чтобы закрыть их при остановке
+opened_connections = []
+opened_connections_lock = threading.Lock()
+
+
+def get_connection():
+    # sqlite3-соединение нельзя разделять между потоками, поэтому каждый
+    # поток открывает своё; потоки пула сервера переиспользуют его между
+    # запросами. check_same_thread=False только ради close_connections(),
+    # который закрывает соединения после остановки потоков пула
+    connection = getattr(connections, 'connection', None)
+    if connection is None:
+        connection = sqlite3.connect('patterns.sqlite', check_same_thread=False)
+        connections.connection = connection
+        with opened_connections_lock:
+            opened_connections.append(connection)
+    return connection
+
+
+def close_connections():
+    """Закрывает соединения всех потоков процесса."""
+    global connections
+    with opened_connections_lock:
+        for connection in opened_connections:
+            connection.close()
+        opened_connections.clear()
+        connections = threading.local()
+
+
+def reset_connections():
+    # соединение, открытое до fork, не должно использоваться (и закрываться)
+    # в дочернем процессе - ссылки на него просто забываются
+    global connections, opened_connections_lock
+    connections = threading.local()
+    opened_connections.clear()
+    opened_connections_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_connections)
+
+
+# Связи клиника-пациент: каждая связь хранится один раз, в массивах рёбер.
+# Для каждой клиники и каждого пациента ведётся свой список рёбер
+# (индексы первого и последнего ребра и ссылка на следующее), поэтому
+# Clinic.patients и Patient.clinics выводятся из одной структуры.
+# Таблица принадлежит Engine и передаётся его клиникам; пациент
+# привязывается к таблице при первой записи в клинику.
+class Membership:
+    def __init__(self):
+        self.clinics = []
+        self.patients = []
+        self.clinic_first = array('i')
+        self.clinic_last = array('i')
+        self.patient_first = array('i')
+        self.patient_last = array('i')
+        self.edge_clinic = array('I')
+        self.edge_patient = array('I')
+        self.next_by_clinic = array('i')
+        self.next_by_patient = array('i')
+        self.lock = threading.Lock()
+
+    def register_clinic(self, clinic):
+        if clinic.index < 0:
+            clinic.index = len(self.clinics)
+            self.clinics.append(clinic)
+            self.clinic_first.append(-1)
+            self.clinic_last.append(-1)
+        return clinic.index
+
+    def register_patient(self, patient):
+        if patient.membership is not self:
+            if patient.membership is not None:
+                raise ValueError(f'Пациент {patient.name} записан в клиники другого Engine.')
+            patient.membership = self
+            patient.index = len(self.patients)
+            self.patients.append(patient)
+            self.patient_first.append(-1)
+            self.patient_last.append(-1)
+        return patient.index
+
+    def add(self, clinic, patient):
+        with self.lock:
+            c = self.register_clinic(clinic)
+            p = self.register_patient(patient)
+            edge = len(self.edge_clinic)
+            self.edge_clinic.append(c)
+            self.edge_patient.append(p)
+            self.next_by_clinic.append(-1)
+            self.next_by_patient.append(-1)
+
+            if self.clinic_last[c] < 0:
+                self.clinic_first[c] = edge
+            else:
+                self.next_by_clinic[self.clinic_last[c]] = edge
+            self.clinic_last[c] = edge
+
+            if self.patient_last[p] < 0:
+                self.patient_first[p] = edge
+            else:
+                self.next_by_patient[self.patient_last[p]] = edge
+            self.patient_last[p] = edge
+
+    def last_patient(self, clinic):
+        # O(1): последнее ребро клиники хранится отдельно
+        if clinic.index < 0 or self.clinic_last[clinic.index] < 0:
+            return None
+        return self.patients[self.edge_patient[self.clinic_last[clinic.index]]]
+
+    def patient_at(self, clinic, position):
+        """Пациент клиники по номеру; проход по списку только до него."""
+        if position == -1:
+            patient = self.last_patient(clinic)
+            if patient is None:
+                raise IndexError('clinic has no patients')
+            return patient
+        if position < 0:
+            return self.patients_of(clinic)[position]
+        edge = self.clinic_first[clinic.index] if clinic.index >= 0 else -1
+        while edge >= 0 and position:
+            edge = self.next_by_clinic[edge]
+            position -= 1
+        if edge < 0:
+            raise IndexError('clinic patient index out of range')
+        return self.patients[self.edge_patient[edge]]
+
+    def patients_of(self, clinic):
+        result = []
+        if clinic.index < 0:
+            return result
+        edge = self.clinic_first[clinic.index]
+        while edge >= 0:
+            result.append(self.patients[self.edge_patient[edge]])
+            edge = self.next_by_clinic[edge]
+        return result
+
+    def clinics_of(self, patient):
+        result = []
+        if patient.index < 0:
+            return result
+        edge = self.patient_first[patient.index]
+        while edge >= 0:
+            result.append(self.clinics[self.edge_clinic[edge]])
+            edge = self.next_by_patient[edge]
+        return result
+
 
 
 # абстрактный пользователь
 class User:
+    __slots__ = ('name',)
+
     def __init__(self, name):
         self.name = name
 
 
 # врач
 class Doctor(User):
-    pass
+    __slots__ = ()
 
 
 # пациент
 class Patient(User, DomainObject):
+    # membership и index - таблица записей и номер в ней,
+    # присваиваются при первой записи в клинику
+    __slots__ = ('id', 'index', 'membership')
+
     def __init__(self, name):
-        self.clinics = []
+        self.index = -1
+        self.membership = None
         super().__init__(name)
 
+    @property
+    def clinics(self):
+        if self.membership is None:
+            return []
+        return self.membership.clinics_of(self)
+
+    def __getstate__(self):
+        # записи в клиники в сериализованного пациента не попадают
+        state = {'name': self.name}
+        if hasattr(self, 'id'):
+            state['id'] = self.id
+        return state
+
+    def __setstate__(self, state):
+        self.name = state['name']
+        if 'id' in state:
+            self.id = state['id']
+        self.index = -1
+        self.membership = None
+
 
 # порождающий паттерн Абстрактная фабрика - фабрика пользователей
 class UserFactory:
@@ -42,40 +216,81 @@ class UserFactory:
 # порождающий паттерн Прототип - Клиника
 class ClinicPrototype:
     # прототип клиник
+    __slots__ = ()
 
     def clone(self):
         return copy.deepcopy(self)
 
 
 class Clinic(ClinicPrototype, Subject):
-    def __init__(self, name, location):
+    # membership - таблица записей Engine (без Engine - своя),
+    # index - номер в ней, присваивается при первой записи пациента
+    __slots__ = ('name', 'location', 'membership', 'index')
+
+    def __init__(self, name, location, membership=None):
         self.name = name
         self.location = location
         self.location.clinics.append(self)
-        self.patients = []
+        self.membership = membership if membership is not None else Membership()
+        self.index = -1
         super().__init__()
 
     def __getitem__(self, item):
+        if isinstance(item, int):
+            return self.membership.patient_at(self, item)
         return self.patients[item]
 
+    @property
+    def patients(self):
+        return self.membership.patients_of(self)
+
+    @property
+    def last_patient(self):
+        return self.membership.last_patient(self)
+
     def add_patient(self, patient: Patient):
-        self.patients.append(patient)
-        patient.clinics.append(self)
+        self.membership.add(self, patient)
         self.notify()
 
+    def __deepcopy__(self, memo):
+        # копия клиники получает собственные записи пациентов;
+        # район и пациенты - общие объекты, они не копируются
+        clinic = self.__class__.__new__(self.__class__)
+        memo[id(self)] = clinic
+        clinic.name = self.name
+        clinic.location = self.location
+        clinic.membership = self.membership
+        clinic.index = -1
+        for patient in self.patients:
+            self.membership.add(clinic, patient)
+        return clinic
+
+    def __getstate__(self):
+        return {'name': self.name, 'location': self.location, 'patients': self.patients}
+
+    def __setstate__(self, state):
+        # загруженная клиника не связана ни с одним Engine
+        self.name = state['name']
+        self.location = state['location']
+        self.membership = Membership()
+        self.index = -1
+        for patient in state['patients']:
+            self.membership.add(self, patient)
+
 
 # Государственная клиника
 class StateClinic(Clinic):
-    pass
+    __slots__ = ()
 
 
 # Частная клиника
 class PrivateClinic(Clinic):
-    pass
+    __slots__ = ()
 
 
 # Местонахождение (район)
 class Location:
+    __slots__ = ('id', 'name', 'location', 'clinics')
     auto_id = 0
 
     def __init__(self, name, location):
@@ -101,8 +316,8 @@ class ClinicFactory:
 
     # порождающий паттерн Фабричный метод
     @classmethod
-    def create(cls, type_, name, location):
-        return cls.types[type_](name, location)
+    def create(cls, type_, name, location, membership=None):
+        return cls.types[type_](name, location, membership)
 
 
 # Основной интерфейс проекта
@@ -112,6 +327,80 @@ class Engine:
         self.patients = []
         self.clinics = []
         self.locations = []
+        # индексы для поиска; по имени хранится первый объект с этим именем
+        self.locations_by_id = {}
+        self.clinics_by_name = {}
+        self.patients_by_name = {}
+        # записи пациентов в клиники этого Engine
+        self.membership = Membership()
+        # журнал изменений (patterns.persistence.Persistence), если подключён
+        self.journal = None
+        self.lock = threading.RLock()
+
+    def record(self, *event):
+        # событие пишется в журнал до изменения состояния: если запись
+        # не удалась, Engine остаётся прежним и не расходится с журналом
+        if self.journal is not None:
+            self.journal.record(event)
+
+    def add_location(self, name, location_id=None):
+        with self.lock:
+            location = None
+            if location_id is not None:
+                location = self.find_location_by_id(location_id)
+            self.record('location', name, -1 if location_id is None else location_id)
+            new_location = self.create_location(name, location)
+            self.register_location(new_location)
+            return new_location
+
+    def register_location(self, location):
+        self.locations.append(location)
+        self.locations_by_id[location.id] = location
+
+    def add_clinic(self, type_, name, location):
+        with self.lock:
+            if type_ not in ClinicFactory.types:
+                raise Exception(f'Неизвестный тип клиники {type_}.')
+            self.record('clinic', type_, name, location.id)
+            clinic = self.create_clinic(type_, name, location)
+            self.register_clinic(clinic)
+            return clinic
+
+    def register_clinic(self, clinic):
+        self.clinics.append(clinic)
+        self.clinics_by_name.setdefault(clinic.name, clinic)
+
+    def copy_clinic(self, name):
+        with self.lock:
+            old_clinic = self.get_clinic(name)
+            if not old_clinic:
+                return None
+            self.record('copy', name)
+            new_clinic = old_clinic.clone()
+            new_clinic.name = f'copy_{name}'
+            self.register_clinic(new_clinic)
+            return new_clinic
+
+    def add_patient(self, name, patient=None):
+        with self.lock:
+            self.record('patient', name)
+            if patient is None:
+                patient = self.create_user('patient', name)
+            self.register_patient(patient)
+            return patient
+
+    def register_patient(self, patient):
+        self.patients.append(patient)
+        self.patients_by_name.setdefault(patient.name, patient)
+
+    def add_patient_to_clinic(self, clinic, patient):
+        with self.lock:
+            if clinic is None or patient is None:
+                raise Exception('Клиника или пациент не найдены.')
+            if patient.membership not in (None, self.membership):
+                raise ValueError(f'Пациент {patient.name} записан в клиники другого Engine.')
+            self.record('visit', clinic.name, patient.name)
+            clinic.add_patient(patient)
 
     @staticmethod
     def create_user(type_, name):
@@ -122,32 +411,19 @@ class Engine:
         return Location(name, location)
 
     def find_location_by_id(self, id):
-        for item in self.locations:
-            print('item', item.id)
-            if item.id == id:
-                return item
-        raise Exception(f'В базе отсутствует район с id = {id}.')
+        try:
+            return self.locations_by_id[id]
+        except KeyError:
+            raise Exception(f'В базе отсутствует район с id = {id}.')
 
-    @staticmethod
-    def create_clinic(type_, name, location):
-        return ClinicFactory.create(type_, name, location)
+    def create_clinic(self, type_, name, location):
+        return ClinicFactory.create(type_, name, location, self.membership)
 
     def get_clinic(self, name):
-        for item in self.clinics:
-            if item.name == name:
-                return item
-        return None
+        return self.clinics_by_name.get(name)
 
     def get_patient(self, name) -> Patient:
-        for item in self.patients:
-            if item.name == name:
-                return item
-
-    @staticmethod
-    def decode_value(val):
-        val_b = bytes(val.replace('%', '=').replace("+", " "), 'UTF-8')
-        val_decode_str = quopri.decodestring(val_b)
-        return val_decode_str.decode('UTF-8')
+        return self.patients_by_name.get(name)
 
 
 # порождающий паттерн Одиночка
@@ -259,8 +535,8 @@ class MapperRegistry:
     @staticmethod
     def get_mapper(obj):
         if isinstance(obj, Patient):
-            return PatientMapper(connection)
+            return PatientMapper(get_connection())
 
     @staticmethod
     def get_current_mapper(name):
-        return MapperRegistry.mappers[name](connection)
+        return MapperRegistry.mappers[name](get_connection())
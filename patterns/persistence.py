@@ -0,0 +1,397 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+from .creational_patterns import ClinicFactory, Location, Patient
+
+
+class JournalCorruptedException(Exception):
+    def __init__(self, message):
+        super().__init__(f'Journal corrupted: {message}')
+
+
+# Журнал изменений Engine: запись = заголовок (длина, номер) + данные + crc32.
+# Поля события кодируются по схеме: s - строка, i - целое число.
+EVENTS = {
+    'location': (1, 'si'),
+    'clinic': (2, 'ssi'),
+    'copy': (3, 's'),
+    'patient': (4, 's'),
+    'visit': (5, 'ss'),
+}
+EVENT_NAMES = {code: (name, fields) for name, (code, fields) in EVENTS.items()}
+
+RECORD_HEADER = struct.Struct('<IQ')
+CRC = struct.Struct('<I')
+STRING_LENGTH = struct.Struct('<I')
+INTEGER = struct.Struct('<i')
+
+SNAPSHOT_MAGIC = b'ENGS'
+SNAPSHOT_HEADER = struct.Struct('<4sBBQ')
+SNAPSHOT_VERSION = 2
+SECTION_LENGTH = struct.Struct('<Q')
+BYTEORDER = {'little': 0, 'big': 1}
+CLINIC_TYPES = list(ClinicFactory.types)
+
+
+def encode_event(event):
+    name, *args = event
+    code, fields = EVENTS[name]
+    parts = [bytes((code,))]
+    for field, value in zip(fields, args):
+        if field == 's':
+            data = value.encode('utf-8')
+            parts.append(STRING_LENGTH.pack(len(data)))
+            parts.append(data)
+        else:
+            parts.append(INTEGER.pack(value))
+    return b''.join(parts)
+
+
+def decode_event(payload):
+    name, fields = EVENT_NAMES[payload[0]]
+    event = [name]
+    pos = 1
+    for field in fields:
+        if field == 's':
+            (length,) = STRING_LENGTH.unpack_from(payload, pos)
+            pos += STRING_LENGTH.size
+            event.append(payload[pos:pos + length].decode('utf-8'))
+            pos += length
+        else:
+            (value,) = INTEGER.unpack_from(payload, pos)
+            pos += INTEGER.size
+            event.append(value)
+    return tuple(event)
+
+
+def read_journal(path):
+    """
+    Возвращает события журнала как пары (номер, событие) и длину
+    целой части файла. Оборванная последняя запись (сбой при записи)
+    отбрасывается; испорченная запись в середине - ошибка.
+    """
+    events = []
+    if not os.path.exists(path):
+        return events, 0
+    with open(path, 'rb') as f:
+        data = f.read()
+    pos = 0
+    while pos + RECORD_HEADER.size <= len(data):
+        length, seq = RECORD_HEADER.unpack_from(data, pos)
+        start = pos + RECORD_HEADER.size
+        end = start + length
+        if end + CRC.size > len(data):
+            break
+        (crc,) = CRC.unpack_from(data, end)
+        if zlib.crc32(data[pos:end]) != crc:
+            if end + CRC.size < len(data):
+                raise JournalCorruptedException(f'{path}: bad record at offset {pos}')
+            break
+        events.append((seq, decode_event(data[start:end])))
+        pos = end + CRC.size
+    return events, pos
+
+
+def write_array(f, values):
+    data = values.tobytes()
+    f.write(SECTION_LENGTH.pack(len(data)))
+    f.write(data)
+
+
+def write_strings(f, strings):
+    # строки хранятся одним блоком плюс массив смещений их концов
+    blob = bytearray()
+    ends = array('Q')
+    for item in strings:
+        blob += item.encode('utf-8')
+        ends.append(len(blob))
+    write_array(f, ends)
+    f.write(SECTION_LENGTH.pack(len(blob)))
+    f.write(blob)
+
+
+class SnapshotReader:
+    """Чтение снимка из отображённого в память файла."""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        magic, version, byteorder, self.seq = SNAPSHOT_HEADER.unpack_from(buffer, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise JournalCorruptedException('unknown snapshot format')
+        self.swap = byteorder != BYTEORDER[sys.byteorder]
+        self.pos = SNAPSHOT_HEADER.size
+
+    def read_bytes(self):
+        (length,) = SECTION_LENGTH.unpack_from(self.buffer, self.pos)
+        start = self.pos + SECTION_LENGTH.size
+        self.pos = start + length
+        return self.buffer[start:self.pos]
+
+    def read_array(self, typecode):
+        values = array(typecode)
+        values.frombytes(self.read_bytes())
+        if self.swap:
+            values.byteswap()
+        return values
+
+    def read_strings(self):
+        ends = self.read_array('Q')
+        blob = self.read_bytes()
+        result = []
+        start = 0
+        for end in ends:
+            result.append(blob[start:end].decode('utf-8'))
+            start = end
+        return result
+
+
+class Persistence:
+    """
+    Сохранение состояния Engine: журнал изменений (только дозапись)
+    и периодические компактные двоичные снимки.
+
+    При старте загружается последний снимок и проигрывается хвост журнала.
+    Снимок делается в фоне: журнал переключается на новый файл, состояние
+    записывается в снимок, после чего старый журнал удаляется.
+    """
+
+    def __init__(self, engine, folder='data', snapshot_interval=300,
+                 snapshot_min_events=10000, fsync=False):
+        """
+        :param engine: экземпляр Engine
+        :param folder: папка для снимка и журнала
+        :param snapshot_interval: период проверки необходимости снимка, секунды
+        :param snapshot_min_events: минимум событий в журнале для нового снимка
+        :param fsync: вызывать fsync после каждой записи в журнал
+        """
+        self.engine = engine
+        self.folder = folder
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_min_events = snapshot_min_events
+        self.fsync = fsync
+        self.snapshot_path = os.path.join(folder, 'snapshot.bin')
+        self.journal_path = os.path.join(folder, 'journal.bin')
+        self.seq = 0
+        self.events_since_snapshot = 0
+        self.journal_file = None
+        self.snapshot_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    # --- восстановление ---
+
+    def recover(self):
+        """Загружает снимок и проигрывает журнал; возвращает число событий."""
+        os.makedirs(self.folder, exist_ok=True)
+        if os.path.exists(self.snapshot_path) and os.path.getsize(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                self.seq = self.load_snapshot(SnapshotReader(buffer))
+
+        replayed = 0
+        for path in self.journal_paths():
+            events, _ = read_journal(path)
+            for seq, event in events:
+                if seq <= self.seq:
+                    continue
+                self.apply(event)
+                self.seq = seq
+                replayed += 1
+        self.events_since_snapshot = replayed
+        return replayed
+
+    def load_snapshot(self, reader):
+        engine = self.engine
+
+        location_ids = reader.read_array('q')
+        location_parents = reader.read_array('q')
+        location_names = reader.read_strings()
+        for id, parent_id, name in zip(location_ids, location_parents, location_names):
+            parent = engine.locations_by_id[parent_id] if parent_id >= 0 else None
+            location = Location(name, parent)
+            location.id = id
+            engine.register_location(location)
+        Location.auto_id = max(Location.auto_id, max(location_ids, default=-1) + 1)
+
+        clinic_types = reader.read_array('B')
+        clinic_locations = reader.read_array('q')
+        clinic_names = reader.read_strings()
+        clinic_in_location = reader.read_array('B')
+        for type_code, location_id, name, in_location in zip(
+                clinic_types, clinic_locations, clinic_names, clinic_in_location):
+            # клиника собирается без __init__: копии (copy_clinic) не входят
+            # в список клиник района, и снимок должен это сохранить
+            cls = ClinicFactory.types[CLINIC_TYPES[type_code]]
+            clinic = cls.__new__(cls)
+            clinic.name = name
+            clinic.location = engine.locations_by_id[location_id]
+            clinic.membership = engine.membership
+            clinic.index = -1
+            if in_location:
+                clinic.location.clinics.append(clinic)
+            engine.register_clinic(clinic)
+
+        for name in reader.read_strings():
+            engine.register_patient(Patient(name))
+
+        link_clinics = reader.read_array('Q')
+        link_patients = reader.read_array('Q')
+        clinics, patients = engine.clinics, engine.patients
+        for clinic_index, patient_index in zip(link_clinics, link_patients):
+            # без notify(): восстановление не должно рассылать уведомления
+            engine.membership.add(clinics[clinic_index], patients[patient_index])
+        return reader.seq
+
+    def apply(self, event):
+        engine = self.engine
+        name, *args = event
+        if name == 'location':
+            location_name, parent_id = args
+            engine.add_location(location_name, parent_id if parent_id >= 0 else None)
+        elif name == 'clinic':
+            type_, clinic_name, location_id = args
+            engine.add_clinic(type_, clinic_name, engine.find_location_by_id(location_id))
+        elif name == 'copy':
+            engine.copy_clinic(args[0])
+        elif name == 'patient':
+            engine.add_patient(args[0])
+        elif name == 'visit':
+            engine.membership.add(engine.get_clinic(args[0]), engine.get_patient(args[1]))
+
+    def journal_paths(self):
+        # переключённые журналы (journal-<номер>.bin) идут раньше текущего
+        rotated = sorted(
+            (int(name[len('journal-'):-len('.bin')]), name)
+            for name in os.listdir(self.folder)
+            if name.startswith('journal-') and name.endswith('.bin')
+        )
+        paths = [os.path.join(self.folder, name) for _, name in rotated]
+        if os.path.exists(self.journal_path):
+            paths.append(self.journal_path)
+        return paths
+
+    # --- запись журнала ---
+
+    def open(self):
+        """Открывает журнал на дозапись и подключает его к Engine."""
+        os.makedirs(self.folder, exist_ok=True)
+        _, valid_length = read_journal(self.journal_path)
+        self.journal_file = open(self.journal_path, 'ab')
+        # оборванная при сбое запись в конце файла отрезается
+        self.journal_file.truncate(valid_length)
+        self.engine.journal = self
+
+    def record(self, event):
+        # вызывается Engine под его блокировкой, порядок записей сохраняется
+        self.seq += 1
+        payload = encode_event(event)
+        record = RECORD_HEADER.pack(len(payload), self.seq) + payload
+        self.journal_file.write(record + CRC.pack(zlib.crc32(record)))
+        self.journal_file.flush()
+        if self.fsync:
+            os.fsync(self.journal_file.fileno())
+        self.events_since_snapshot += 1
+
+    def start(self):
+        """Открывает журнал и запускает фоновое создание снимков."""
+        self.open()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name='snapshots', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.snapshot_interval):
+            if self.events_since_snapshot >= self.snapshot_min_events:
+                self.snapshot()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.journal_file is not None:
+            self.engine.journal = None
+            self.journal_file.close()
+            self.journal_file = None
+
+    # --- снимки ---
+
+    def snapshot(self):
+        """Записывает снимок состояния и удаляет поглощённый им журнал."""
+        with self.snapshot_lock:
+            engine = self.engine
+            with engine.lock:
+                seq = self.seq
+                state = self.capture()
+                rotated_path = None
+                if self.journal_file is not None:
+                    # новые события пишутся в новый файл, пока делается снимок
+                    self.journal_file.close()
+                    rotated_path = os.path.join(self.folder, f'journal-{seq}.bin')
+                    os.replace(self.journal_path, rotated_path)
+                    self.journal_file = open(self.journal_path, 'ab')
+                self.events_since_snapshot = 0
+
+            self.write_snapshot(seq, *state)
+            for path in self.journal_paths():
+                if path != self.journal_path:
+                    os.remove(path)
+
+    def capture(self):
+        # копия состояния в виде плоских массивов, снимаемая под блокировкой Engine
+        engine = self.engine
+        locations = engine.locations
+        location_ids = array('q', (item.id for item in locations))
+        location_parents = array('q', (item.location.id if item.location else -1
+                                       for item in locations))
+        location_names = [item.name for item in locations]
+
+        clinic_type_codes = {cls: code for code, cls in enumerate(ClinicFactory.types.values())}
+        clinic_types = array('B', (clinic_type_codes[type(item)] for item in engine.clinics))
+        clinic_locations = array('q', (item.location.id for item in engine.clinics))
+        clinic_names = [item.name for item in engine.clinics]
+        placed = {id(clinic) for location in locations for clinic in location.clinics}
+        clinic_in_location = array('B', (id(item) in placed for item in engine.clinics))
+
+        patient_names = [item.name for item in engine.patients]
+
+        # связи сохраняются по индексу первого пациента с тем же именем
+        patient_indexes = {}
+        for index, patient in enumerate(engine.patients):
+            patient_indexes.setdefault(patient.name, index)
+        link_clinics = array('Q')
+        link_patients = array('Q')
+        for clinic_index, clinic in enumerate(engine.clinics):
+            for patient in clinic.patients:
+                link_clinics.append(clinic_index)
+                link_patients.append(patient_indexes[patient.name])
+
+        return (location_ids, location_parents, location_names,
+                clinic_types, clinic_locations, clinic_names, clinic_in_location,
+                patient_names, link_clinics, link_patients)
+
+    def write_snapshot(self, seq, location_ids, location_parents, location_names,
+                       clinic_types, clinic_locations, clinic_names, clinic_in_location,
+                       patient_names, link_clinics, link_patients):
+        tmp_path = f'{self.snapshot_path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                                         BYTEORDER[sys.byteorder], seq))
+            write_array(f, location_ids)
+            write_array(f, location_parents)
+            write_strings(f, location_names)
+            write_array(f, clinic_types)
+            write_array(f, clinic_locations)
+            write_strings(f, clinic_names)
+            write_array(f, clinic_in_location)
+            write_strings(f, patient_names)
+            write_array(f, link_clinics)
+            write_array(f, link_patients)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
@@ -1,11 +1,115 @@
+import os
+import signal
+import sys
+from time import perf_counter
 from wsgiref.simple_server import make_server
 
+started = perf_counter()
+
+from e_framework.admission import AdmissionControl
+from e_framework.compression import Compression
+from e_framework.lifecycle import memory_usage
 from e_framework.main import Framework
+from e_framework.server import ThreadPoolWSGIServer
+from e_framework.templator import precompile
+from patterns.architectural_system_pattern_unit_of_work import UnitOfWork
+from patterns.creational_patterns import close_connections
+from patterns.persistence import Persistence
 from urls import fronts
-from views import routes
+from views import routes, site
+
+# число процессов-воркеров, разделяющих один сокет
+# Ограничение: каждый воркер после fork работает со своей копией
+# состояния site (Engine) - изменения, сделанные в одном воркере, другим
+# не видны, общими остаются только данные в БД. Поэтому WORKERS > 1
+# годится лишь для нагрузки, которая в основном читает.
+WORKERS = int(os.environ.get('WORKERS', 1))
+STOP_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+# потоков обработки запросов в каждом воркере
+ThreadPoolWSGIServer.pool_size = int(os.environ.get('THREADS', 16))
+
+
+# GET-запросам доступны все слоты, тяжёлые POST отсекаются первыми
+admission = AdmissionControl(max_concurrency=8, max_queue_delay=0.5,
+                             priorities={'GET': 1.0, 'POST': 0.5})
+compression = Compression(min_size=1024)
+application = Framework(routes, fronts, UnitOfWork, admission, compression)
+application.on_startup(precompile)
+application.on_shutdown(close_connections)
+
+
+@application.on_shutdown
+def compression_report():
+    for line in compression.report():
+        print(f'Сжатие {line}')
+
+# состояние Engine восстанавливается до fork; журнал ведётся только
+# в однопроцессном режиме - у каждого воркера своя копия состояния
+persistence = Persistence(site, 'data')
+application.on_startup(persistence.recover)
+if WORKERS == 1:
+    application.on_worker_start(persistence.start)
+    application.on_shutdown(persistence.stop)
+else:
+    print(f'Внимание: WORKERS={WORKERS}, журнал изменений отключён - '
+          f'изменения, сделанные после запуска, не сохранятся', file=sys.stderr)
+
+
+def serve(httpd):
+    # SIGTERM завершает воркер так же, как Ctrl+C: с вызовом хуков остановки
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    application.start_worker()
+    rss, private = memory_usage()
+    print(f'Воркер {os.getpid()}: RSS {rss} КБ, из них приватных {private} КБ')
+    try:
+        httpd.serve_forever()
+    finally:
+        # повторный сигнал не должен прервать хуки остановки
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        # соединения закрываются хуком остановки, когда потоки пула уже стоят
+        httpd.close_pool()
+        application.shutdown()
+
+
+def supervise(workers):
+    """Пересылает SIGTERM/SIGINT воркерам и дожидается их завершения."""
+    def forward(signum, frame):
+        for pid in workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+    for pid in workers:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+
 
-application = Framework(routes, fronts)
+with make_server('', 8080, application, server_class=ThreadPoolWSGIServer) as httpd:
+    application.warm_up()
+    rss, _ = memory_usage()
+    print(f"Запуск на порту 8080: старт {(perf_counter() - started) * 1000:.0f} мс, RSS {rss} КБ")
 
-with make_server('', 8080, application) as httpd:
-    print("Запуск на порту 8080...")
-    httpd.serve_forever()
+    if WORKERS > 1:
+        workers = []
+        # до установки обработчиков в родителе сигналы остановки
+        # откладываются, чтобы родитель не завершился, бросив воркеров
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        for _ in range(WORKERS):
+            pid = os.fork()
+            if pid == 0:
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+                try:
+                    serve(httpd)
+                finally:
+                    os._exit(0)
+            workers.append(pid)
+        supervise(workers)
+    else:
+        serve(httpd)
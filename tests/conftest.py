@@ -0,0 +1,26 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from patterns.creational_patterns import close_connections  # noqa: E402
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Рабочая папка приложения: пустая БД и шаблоны проекта."""
+    with open(os.path.join(ROOT, 'create_db.sql')) as f:
+        script = f.read()
+    connection = sqlite3.connect(tmp_path / 'patterns.sqlite')
+    connection.executescript(script)
+    connection.close()
+    os.symlink(os.path.join(ROOT, 'templates'), tmp_path / 'templates')
+    monkeypatch.chdir(tmp_path)
+    # соединения прошлых тестов открыты к их собственным БД
+    close_connections()
+    yield tmp_path
+    close_connections()
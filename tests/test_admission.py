@@ -0,0 +1,87 @@
+import threading
+import time
+
+from e_framework.admission import AdmissionControl, TokenBucket
+
+
+def request(method):
+    return {'method': method, 'client': '127.0.0.1'}
+
+
+def wait_for_waiters(admission, count):
+    deadline = time.monotonic() + 2
+    while len(admission.condition._waiters) < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_get_is_admitted_when_post_waits_first():
+    admission = AdmissionControl(max_concurrency=2, max_queue_delay=1,
+                                 priorities={'GET': 1.0, 'POST': 0.5})
+    assert admission.admit(request('GET'), {})
+    assert admission.admit(request('GET'), {})
+
+    results = {}
+
+    def admit(method):
+        started = time.monotonic()
+        results[method] = (admission.admit(request(method), {}),
+                           time.monotonic() - started)
+
+    post = threading.Thread(target=admit, args=('POST',))
+    post.start()
+    wait_for_waiters(admission, 1)
+    get = threading.Thread(target=admit, args=('GET',))
+    get.start()
+    wait_for_waiters(admission, 2)
+
+    admission.release()
+    get.join()
+    post.join()
+
+    admitted, waited = results['GET']
+    assert admitted
+    assert waited < 0.5
+    assert not results['POST'][0]
+
+
+def test_queue_delay_units():
+    now = time.time()
+    for value in (f't={now - 0.2:.3f}', f'{(now - 0.2) * 1e3:.0f}', f't={(now - 0.2) * 1e6:.0f}'):
+        delay = AdmissionControl.get_queue_delay({'HTTP_X_REQUEST_START': value})
+        assert 0.1 < delay < 1, value
+
+
+def test_queue_delay_ignores_implausible_values():
+    now = time.time()
+    for value in (f't={now + 60:.3f}', 't=1000', 'garbage', ''):
+        assert AdmissionControl.get_queue_delay({'HTTP_X_REQUEST_START': value}) == 0
+
+
+def test_nginx_header_does_not_shed():
+    admission = AdmissionControl(max_concurrency=1, max_queue_delay=0.5)
+    environ = {'HTTP_X_REQUEST_START': f't={time.time():.3f}'}
+    assert admission.admit(request('GET'), environ)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=1, capacity=2)
+    assert bucket.consume('a') == 0
+    assert bucket.consume('a') == 0
+    assert bucket.consume('a') > 0
+    assert bucket.consume('b') == 0
+
+
+def test_token_bucket_evicts_least_recently_seen_clients():
+    bucket = TokenBucket(rate=0.001, capacity=1, max_clients=3)
+    for client in 'abc':
+        assert bucket.consume(client) == 0
+    # 'a' обратился снова и стал самым недавним
+    assert bucket.consume('a') > 0
+    assert bucket.consume('d') == 0
+    assert list(bucket.buckets) == ['c', 'a', 'd']
+    # все клиенты активны, но таблица не растёт и не перестраивается
+    for i in range(100):
+        bucket.consume(f'client {i}')
+    assert len(bucket.buckets) == 3
+    assert bucket.consume('a') == 0
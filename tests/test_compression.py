@@ -0,0 +1,125 @@
+import gzip
+import zlib
+
+import pytest
+
+from e_framework.admission import AdmissionControl
+from e_framework.compression import Compression
+from e_framework.main import Framework
+from patterns.architectural_system_pattern_unit_of_work import UnitOfWork
+
+PAGE = 'страница ' * 300
+
+
+def get(application, path, accept_encoding=None):
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', 'QUERY_STRING': ''}
+    if accept_encoding:
+        environ['HTTP_ACCEPT_ENCODING'] = accept_encoding
+    response = []
+    body = application(environ, lambda code, headers: response.extend((code, dict(headers))))
+    return response[0], response[1], b''.join(body)
+
+
+def make_application(compression):
+    routes = {
+        '/': lambda request: ('200 OK', PAGE),
+        '/small/': lambda request: ('200 OK', 'ok'),
+        '/image/': lambda request: ('200 OK', PAGE, 'image/png'),
+        '/stream/': lambda request: ('200 OK', iter(['a' * 10, 'b' * 10])),
+    }
+    return Framework(routes, [], compression=compression)
+
+
+def test_every_response_is_counted():
+    compression = Compression(min_size=1024)
+    application = make_application(compression)
+    size = len(PAGE.encode())
+
+    code, headers, body = get(application, '/', 'gzip')
+    assert headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(body) == PAGE.encode()
+    get(application, '/')
+    get(application, '/small/', 'gzip')
+    _, headers, _ = get(application, '/image/', 'gzip')
+    assert 'Content-Encoding' not in headers
+    code, _, _ = get(application, '/missing/', 'gzip')
+    assert code.startswith('404')
+    get(application, '/stream/')
+
+    stats = compression.stats
+    assert stats['/'][:3] == [2, 2 * size, len(body) + size]
+    assert stats['/small/'][:3] == [1, 2, 2]
+    assert stats['/image/'][:3] == [1, size, size]
+    assert stats['404'][:3] == [1, 18, 18]
+    assert stats['/stream/'][:3] == [1, 20, 20]
+
+
+def test_stream_flushes_every_chunk():
+    compression = Compression()
+    chunks = [f'фрагмент {i} '.encode() * 20 for i in range(5)]
+    decompressor = zlib.decompressobj(31)
+    received = b''
+    parts = compression.stream('/', iter(chunks), 'gzip')
+    for i, chunk in enumerate(chunks):
+        # каждый фрагмент можно распаковать сразу, не дожидаясь конца ответа
+        received += decompressor.decompress(next(parts))
+        assert received == b''.join(chunks[:i + 1])
+    received += decompressor.decompress(b''.join(parts))
+    assert received == b''.join(chunks)
+    assert compression.stats['/'][1] == len(received)
+
+
+class Registry:
+    @staticmethod
+    def get_mapper(obj):
+        return None
+
+
+def make_streaming_application(events, fail=False):
+    def stream(request):
+        def body():
+            # тело выполняется уже во время отдачи ответа сервером
+            unit_of_work = UnitOfWork.get_current()
+            unit_of_work.set_mapper_registry(Registry)
+            unit_of_work.on_commit(lambda: events.append('commit'))
+            events.append(('in flight', admission.in_flight))
+            yield 'chunk 1 '
+            if fail:
+                raise RuntimeError('stream failed')
+            yield 'chunk 2'
+        return '200 OK', body()
+
+    admission = AdmissionControl(max_concurrency=2)
+    application = Framework({'/stream/': stream}, [], UnitOfWork, admission, Compression())
+    return application, admission
+
+
+def test_stream_keeps_request_resources_until_closed():
+    events = []
+    application, admission = make_streaming_application(events)
+    environ = {'PATH_INFO': '/stream/', 'REQUEST_METHOD': 'GET', 'QUERY_STRING': '',
+               'HTTP_ACCEPT_ENCODING': 'gzip'}
+    body = application(environ, lambda code, headers: None)
+    assert admission.in_flight == 1
+    data = b''.join(body)
+    assert events == [('in flight', 1)]
+    assert admission.in_flight == 1
+    body.close()
+    assert events == [('in flight', 1), 'commit']
+    assert admission.in_flight == 0
+    assert gzip.decompress(data) == b'chunk 1 chunk 2'
+    assert application.compression.stats['/stream/'][:3] == [1, 15, len(data)]
+
+
+def test_failed_stream_rolls_back_and_releases_slot():
+    events = []
+    application, admission = make_streaming_application(events, fail=True)
+    environ = {'PATH_INFO': '/stream/', 'REQUEST_METHOD': 'GET', 'QUERY_STRING': ''}
+    body = application(environ, lambda code, headers: None)
+    assert next(body) == b'chunk 1 '
+    with pytest.raises(RuntimeError):
+        next(body)
+    assert admission.in_flight == 0
+    body.close()
+    assert events == [('in flight', 1)]
+    assert admission.in_flight == 0
@@ -0,0 +1,43 @@
+from e_framework.template_extensions import FragmentCacheExtension
+from e_framework.templator import FragmentCache, fragment_cache, invalidate
+
+
+def test_set_after_invalidate_is_dropped():
+    cache = FragmentCache()
+    generation = cache.generation('patients')
+    cache.invalidate('patients')
+    cache.set(('patients',), 'stale', 60, generation)
+    assert cache.get(('patients',)) is None
+
+    cache.set(('patients',), 'fresh', 60, cache.generation('patients'))
+    assert cache.get(('patients',)) == 'fresh'
+
+
+def test_invalidate_during_render_is_not_cached():
+    fragment_cache.clear()
+    data = ['old']
+
+    def render_racing_with_post():
+        value = data[0]
+        # POST меняет данные и сбрасывает тег, пока GET рендерит фрагмент
+        data[0] = 'new'
+        invalidate('race')
+        return value
+
+    assert FragmentCacheExtension._cache('race', 60, render_racing_with_post) == 'old'
+    assert fragment_cache.get(('race',)) is None
+    assert FragmentCacheExtension._cache('race', 60, lambda: data[0]) == 'new'
+    assert fragment_cache.get(('race',)) == 'new'
+
+
+def test_patients_list_is_read_from_db_on_every_request(workdir):
+    from e_framework.templator import render
+    from patterns.creational_patterns import Patient
+
+    fragment_cache.clear()
+    # список пациентов общий для всех воркеров (БД) и не кэшируется:
+    # сброс кэша в одном процессе другие воркеры не увидели бы
+    first = render('patients_list.html', objects_list=[Patient('Иван')])
+    second = render('patients_list.html', objects_list=[Patient('Пётр')])
+    assert 'Иван' in first
+    assert 'Пётр' in second and 'Иван' not in second
@@ -0,0 +1,93 @@
+import gc
+import os
+import sqlite3
+import threading
+import urllib.request
+from wsgiref.simple_server import make_server
+
+import pytest
+
+from e_framework.main import Framework
+from e_framework.server import ThreadPoolWSGIServer
+from patterns import creational_patterns
+from patterns.creational_patterns import close_connections, get_connection
+
+
+def test_hooks_run_in_order():
+    calls = []
+    application = Framework({}, [])
+    application.on_startup(lambda: calls.append('startup'))
+    application.on_worker_start(lambda: calls.append('worker'))
+    application.on_shutdown(lambda: calls.append('shutdown 1'))
+    application.on_shutdown(lambda: calls.append('shutdown 2'))
+
+    application.warm_up()
+    try:
+        # всё созданное при прогреве исключено из сборки мусора
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+    application.start_worker()
+    application.shutdown()
+    assert calls == ['startup', 'worker', 'shutdown 2', 'shutdown 1']
+
+
+def test_close_connections_closes_every_thread(workdir):
+    opened = []
+    threads = [threading.Thread(target=lambda: opened.append(get_connection()))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    main = get_connection()
+    assert get_connection() is main
+    close_connections()
+    for connection in [main, *opened]:
+        with pytest.raises(sqlite3.ProgrammingError, match='closed'):
+            connection.execute('SELECT 1')
+    assert creational_patterns.opened_connections == []
+    assert get_connection() is not main
+
+
+def test_connections_are_reset_after_fork(workdir):
+    parent = get_connection()
+    pid = os.fork()
+    if pid == 0:
+        ok = (get_connection() is not parent
+              and creational_patterns.opened_connections == [get_connection()])
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # соединение родителя потомок не закрывал
+    parent.execute('SELECT 1')
+
+
+def test_pool_threads_reuse_connections(workdir):
+    seen = []
+
+    def application(environ, start_response):
+        seen.append((threading.get_ident(), id(get_connection())))
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    class Server(ThreadPoolWSGIServer):
+        pool_size = 2
+
+    httpd = make_server('127.0.0.1', 0, application, server_class=Server)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    try:
+        for _ in range(10):
+            url = f'http://127.0.0.1:{httpd.server_port}/'
+            with urllib.request.urlopen(url) as response:
+                assert response.read() == b'ok'
+    finally:
+        httpd.shutdown()
+        thread.join()
+        httpd.close_pool()
+        httpd.server_close()
+    assert len(seen) == 10
+    assert len({ident for ident, _ in seen}) <= 2
+    assert len({connection for _, connection in seen}) <= 2
+    assert len(creational_patterns.opened_connections) <= 2
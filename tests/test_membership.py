@@ -0,0 +1,87 @@
+import pytest
+
+from patterns.creational_patterns import Engine
+
+
+def make_engine():
+    engine = Engine()
+    location = engine.add_location('Город')
+    clinics = [engine.add_clinic('state', name, location) for name in 'AB']
+    patients = [engine.add_patient(name) for name in ('Иван', 'Пётр', 'Анна')]
+    return engine, clinics, patients
+
+
+def test_indexing_walks_only_to_the_patient():
+    engine, (clinic, _), patients = make_engine()
+    assert clinic.last_patient is None
+    with pytest.raises(IndexError):
+        clinic[0]
+    for patient in patients:
+        clinic.add_patient(patient)
+        assert clinic.last_patient is patient
+    assert [clinic[i] for i in range(3)] == patients
+    assert clinic[-1] is patients[-1] and clinic[-2] is patients[1]
+    assert clinic[1:] == patients[1:]
+    with pytest.raises(IndexError):
+        clinic[3]
+
+
+def test_order_in_both_directions():
+    engine, (a, b), (ivan, petr, anna) = make_engine()
+    engine.add_patient_to_clinic(b, petr)
+    engine.add_patient_to_clinic(a, ivan)
+    engine.add_patient_to_clinic(a, anna)
+    engine.add_patient_to_clinic(a, petr)
+    engine.add_patient_to_clinic(b, anna)
+    assert a.patients == [ivan, anna, petr]
+    assert b.patients == [petr, anna]
+    assert petr.clinics == [b, a]
+    assert anna.clinics == [a, b]
+    assert ivan.clinics == [a]
+
+
+def test_engines_do_not_share_membership():
+    first, (clinic, _), (patient, *_) = make_engine()
+    second = Engine()
+    first.add_patient_to_clinic(clinic, patient)
+    assert len(first.membership.edge_clinic) == 1
+    assert len(second.membership.edge_clinic) == 0
+    other = second.add_clinic('state', 'A', second.add_location('Город'))
+    with pytest.raises(ValueError):
+        other.add_patient(patient)
+
+
+def test_clone_shares_patients_but_not_edges():
+    engine, (clinic, _), (ivan, petr, _) = make_engine()
+    engine.add_patient_to_clinic(clinic, ivan)
+    copy = engine.copy_clinic('A')
+    assert copy.patients == [ivan]
+    assert copy.patients[0] is ivan
+    assert copy.location is clinic.location and copy not in clinic.location.clinics
+
+    engine.add_patient_to_clinic(copy, petr)
+    assert clinic.patients == [ivan]
+    assert copy.patients == [ivan, petr]
+    assert ivan.clinics == [clinic, copy]
+
+
+def test_api_round_trip(workdir):
+    from patterns.behavioral_patterns import BaseSerializer
+    from views import routes, site
+
+    location = site.add_location('Район')
+    clinic = site.add_clinic('private', 'Клиника', location)
+    patient = site.add_patient('Иван')
+    site.add_patient_to_clinic(clinic, patient)
+    edges = len(site.membership.edge_clinic)
+
+    code, body, content_type = routes['/api/']({'method': 'GET'})
+    assert (code, content_type) == ('200 OK', 'application/json')
+    loaded = BaseSerializer.load(body)
+    restored = loaded[-1]
+    assert type(restored) is type(clinic)
+    assert restored.name == 'Клиника' and restored.location.name == 'Район'
+    assert [item.name for item in restored.patients] == ['Иван']
+    assert restored.patients[0].clinics == [restored]
+    # загрузка не добавляет записей в таблицу Engine
+    assert len(site.membership.edge_clinic) == edges
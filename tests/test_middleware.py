@@ -0,0 +1,66 @@
+from e_framework.middleware import Front, compile_chain
+
+
+def view(request):
+    request['calls'].append('view')
+    return '200 OK', 'view'
+
+
+def make_fronts():
+    @Front(routes=['/a/'], methods=['GET'])
+    def only_get_a(request):
+        request['calls'].append('only_get_a')
+
+    @Front()
+    def everywhere(request):
+        request['calls'].append('everywhere')
+
+    @Front(methods=['POST'])
+    def deny_post(request):
+        request['calls'].append('deny_post')
+        return '403 Forbidden', 'denied'
+
+    @Front(routes=['/a/'], after=True)
+    def add_footer(request, response):
+        request['calls'].append('add_footer')
+        code, body = response
+        return code, f'{body} footer'
+
+    return [only_get_a, everywhere, deny_post, add_footer]
+
+
+def call(chain):
+    request = {'calls': []}
+    return chain(request), request['calls']
+
+
+def test_fronts_are_selected_by_route_and_method():
+    fronts = make_fronts()
+    response, calls = call(compile_chain(view, fronts, '/a/', 'GET'))
+    assert response == ('200 OK', 'view footer')
+    assert calls == ['only_get_a', 'everywhere', 'view', 'add_footer']
+
+    response, calls = call(compile_chain(view, fronts, '/b/', 'GET'))
+    assert response == ('200 OK', 'view')
+    assert calls == ['everywhere', 'view']
+
+
+def test_before_front_response_skips_view_and_after_fronts():
+    response, calls = call(compile_chain(view, make_fronts(), '/a/', 'POST'))
+    assert response == ('403 Forbidden', 'denied')
+    assert calls == ['everywhere', 'deny_post']
+
+
+def test_route_without_fronts_gets_the_bare_view():
+    assert compile_chain(view, [], '/a/', 'GET') is view
+    only_a = [front for front in make_fronts() if front.routes == ['/a/']]
+    assert compile_chain(view, only_a, '/b/', 'GET') is view
+
+
+def test_plain_functions_apply_everywhere_before_the_view():
+    def legacy(request):
+        request['calls'].append('legacy')
+
+    response, calls = call(compile_chain(view, [legacy], '/b/', 'PUT'))
+    assert response == ('200 OK', 'view')
+    assert calls == ['legacy', 'view']
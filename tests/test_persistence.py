@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+from patterns.creational_patterns import Engine, Location
+from patterns.persistence import (RECORD_HEADER, JournalCorruptedException, Persistence,
+                                  read_journal)
+
+
+def state(engine):
+    return {
+        'locations': [(item.id, item.name, item.clinics_count(),
+                       [clinic.name for clinic in item.clinics])
+                      for item in engine.locations],
+        'clinics': [(type(item).__name__, item.name, item.location.id,
+                     [patient.name for patient in item.patients])
+                    for item in engine.clinics],
+        'patients': [(item.name, [clinic.name for clinic in item.clinics])
+                     for item in engine.patients],
+    }
+
+
+def recover(folder):
+    Location.auto_id = 0
+    engine = Engine()
+    Persistence(engine, folder).recover()
+    return engine
+
+
+def test_snapshot_recovery_matches_journal_replay(tmp_path):
+    Location.auto_id = 0
+    engine = Engine()
+    persistence = Persistence(engine, str(tmp_path))
+    persistence.open()
+    city = engine.add_location('Город')
+    engine.add_location('Центр', city.id)
+    clinic = engine.add_clinic('state', 'A', city)
+    engine.add_clinic('private', 'B', engine.find_location_by_id(1))
+    patient = engine.add_patient('Иван')
+    engine.add_patient_to_clinic(clinic, patient)
+    engine.copy_clinic('A')
+    expected = state(engine)
+    # копия клиники не входит в список клиник района
+    assert city.clinics_count() == 1
+
+    assert state(recover(str(tmp_path))) == expected
+
+    persistence.snapshot()
+    persistence.stop()
+    assert persistence.journal_paths() == [persistence.journal_path]
+    assert state(recover(str(tmp_path))) == expected
+
+
+def test_long_names_are_journaled(tmp_path):
+    Location.auto_id = 0
+    engine = Engine()
+    persistence = Persistence(engine, str(tmp_path))
+    persistence.open()
+    name = 'р' * 40000  # 80 000 байт в UTF-8
+    location = engine.add_location(name)
+    engine.add_clinic('state', name, location)
+    persistence.stop()
+
+    recovered = recover(str(tmp_path))
+    assert recovered.locations[0].name == name
+    assert recovered.clinics[0].name == name
+
+
+class FailingJournal:
+    def record(self, event):
+        raise OSError('disk full')
+
+
+def test_failed_record_leaves_engine_unchanged():
+    Location.auto_id = 0
+    engine = Engine()
+    location = engine.add_location('Город')
+    clinic = engine.add_clinic('state', 'A', location)
+    patient = engine.add_patient('Иван')
+    before = state(engine)
+    engine.journal = FailingJournal()
+    for action in (lambda: engine.add_location('Центр'),
+                   lambda: engine.add_clinic('state', 'B', location),
+                   lambda: engine.copy_clinic('A'),
+                   lambda: engine.add_patient('Пётр'),
+                   lambda: engine.add_patient_to_clinic(clinic, patient)):
+        with pytest.raises(OSError):
+            action()
+    assert state(engine) == before
+    assert Location.auto_id == 1
+
+
+def write_journal(folder, count):
+    Location.auto_id = 0
+    persistence = Persistence(Engine(), folder)
+    persistence.open()
+    for i in range(count):
+        persistence.engine.add_location(f'район {i}')
+    persistence.stop()
+    return persistence.journal_path
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    path = write_journal(str(tmp_path), 3)
+    with open(path, 'rb') as f:
+        data = f.read()
+    events, length = read_journal(path)
+    assert length == len(data)
+    # сбой во время записи последнего события
+    with open(path, 'wb') as f:
+        f.write(data[:-3])
+    events, length = read_journal(path)
+    assert [event for _, event in events] == [('location', 'район 0', -1),
+                                              ('location', 'район 1', -1)]
+    assert [location.name for location in recover(str(tmp_path)).locations] == \
+        ['район 0', 'район 1']
+
+    # при открытии оборванная запись отрезается, новые события пишутся следом
+    persistence = Persistence(recover(str(tmp_path)), str(tmp_path))
+    persistence.open()
+    persistence.engine.add_location('район 2')
+    persistence.stop()
+    assert len(read_journal(path)[0]) == 3
+    assert os.path.getsize(path) == len(data)
+
+
+def test_corrupted_record_in_the_middle_is_an_error(tmp_path):
+    path = write_journal(str(tmp_path), 3)
+    with open(path, 'r+b') as f:
+        f.seek(RECORD_HEADER.size + 2)
+        f.write(b'X')
+    with pytest.raises(JournalCorruptedException):
+        read_journal(path)
+    with pytest.raises(JournalCorruptedException):
+        recover(str(tmp_path))
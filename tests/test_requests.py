@@ -0,0 +1,51 @@
+import io
+from urllib.parse import unquote
+
+from e_framework.requests import GetRequests, PostRequests, unquote_value
+
+
+def test_decodes_percent_and_plus():
+    params = GetRequests.parse_input_data('name=%D0%98%D0%B2%D0%B0%D0%BD+%D0%9F')
+    assert params == {'name': 'Иван П'}
+
+
+def test_literal_and_encoded_equals_sign():
+    params = GetRequests.parse_input_data('a=b=c&d=x%3Dy')
+    assert params == {'a': 'b=c', 'd': 'x=y'}
+
+
+def test_encoded_percent_is_decoded_once():
+    assert GetRequests.parse_input_data('p=100%25')['p'] == '100%'
+    assert GetRequests.parse_input_data('p=%2541')['p'] == '%41'
+
+
+def test_malformed_escape_is_kept():
+    assert GetRequests.parse_input_data('p=%2')['p'] == '%2'
+    assert GetRequests.parse_input_data('p=a%zzb%')['p'] == 'a%zzb%'
+
+
+def test_repeated_keys():
+    params = GetRequests.parse_input_data('t=1&t=2&x=&y')
+    assert params['t'] == '2'
+    assert params.getlist('t') == ['1', '2']
+    assert params.getlist('missing') == []
+    assert params['x'] == '' and params['y'] == ''
+
+
+def test_post_body():
+    body = 'clinic_name=A%3DB+1&patient_name=%D0%AF'.encode()
+    environ = {'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body)}
+    assert PostRequests().get_request_params(environ) == {'clinic_name': 'A=B 1',
+                                                          'patient_name': 'Я'}
+
+
+def test_empty_body():
+    environ = {'CONTENT_LENGTH': '', 'wsgi.input': io.BytesIO(b'')}
+    assert PostRequests().get_request_params(environ) == {}
+
+
+def test_matches_urllib_unquote():
+    values = ['%2', '%4', '%%41', '%2541', 'a%zzb%', 'x\\x41%41', '\\', '%5C%78%34%31',
+              '%5c%6e', '%d0%98%d0', '%E2%82', 'Иван%20%D0%98', '%00%FF', '']
+    for value in values:
+        assert unquote_value(value) == unquote(value), value
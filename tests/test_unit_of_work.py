@@ -0,0 +1,138 @@
+import io
+import sqlite3
+import threading
+
+import pytest
+
+from e_framework.main import DebugApplication, Framework
+from patterns.architectural_system_pattern_unit_of_work import (UnitOfWork,
+                                                               UnitOfWorkNotStartedException)
+from patterns.creational_patterns import Patient
+
+
+def post(application, path, body, client):
+    environ = {
+        'PATH_INFO': path,
+        'REQUEST_METHOD': 'POST',
+        'QUERY_STRING': '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'REMOTE_ADDR': client,
+    }
+    status = []
+    application(environ, lambda code, headers: status.append(code))
+    return status[0]
+
+
+def test_parallel_create_patient(workdir):
+    from urls import fronts
+    from views import routes, site
+
+    application = Framework(routes, fronts, UnitOfWork)
+    names = [f'patient_{i}' for i in range(50)]
+    statuses = []
+    errors = []
+
+    def send(i, name):
+        try:
+            statuses.append(post(application, '/create-patient/',
+                                 f'name={name}'.encode(), f'10.0.0.{i}'))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=send, args=(i, name)) for i, name in enumerate(names)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert statuses == ['200 OK'] * len(names)
+    connection = sqlite3.connect(workdir / 'patterns.sqlite')
+    rows = {name for (name,) in connection.execute('SELECT name FROM patient')}
+    connection.close()
+    assert rows == set(names)
+    assert set(names) <= {patient.name for patient in site.patients}
+
+
+class FailingMapper:
+    def insert(self, obj):
+        raise sqlite3.OperationalError('database is locked')
+
+
+class FailingRegistry:
+    @staticmethod
+    def get_mapper(obj):
+        return FailingMapper()
+
+
+def test_failed_commit_skips_commit_hooks():
+    done = []
+    with pytest.raises(sqlite3.OperationalError):
+        with UnitOfWork.scope() as unit_of_work:
+            unit_of_work.set_mapper_registry(FailingRegistry)
+            Patient('Иван').mark_new()
+            unit_of_work.on_commit(lambda: done.append(True))
+    assert done == []
+    assert unit_of_work.new_objects == []
+    assert unit_of_work.commit_hooks == []
+
+
+def test_scope_is_reset_after_request():
+    with UnitOfWork.scope() as unit_of_work:
+        assert UnitOfWork.get_current() is unit_of_work
+    with pytest.raises(LookupError):
+        UnitOfWork.get_current()
+
+
+def test_create_patient_without_framework_unit_of_work(workdir):
+    from urls import fronts
+    from views import routes, site
+
+    for application in (Framework(routes, fronts), DebugApplication(routes, fronts)):
+        name = f'patient_{type(application).__name__}'
+        assert post(application, '/create-patient/', f'name={name}'.encode(),
+                    '10.0.1.1') == '200 OK'
+        assert site.get_patient(name) is not None
+    connection = sqlite3.connect(workdir / 'patterns.sqlite')
+    rows = {name for (name,) in connection.execute('SELECT name FROM patient')}
+    connection.close()
+    assert rows == {'patient_Framework', 'patient_DebugApplication'}
+
+
+def test_domain_object_without_scope_fails_clearly():
+    with pytest.raises(UnitOfWorkNotStartedException, match='UnitOfWork.scope'):
+        Patient('Иван').mark_new()
+
+
+def test_joined_scope_is_committed_by_the_outer_scope():
+    done = []
+    with UnitOfWork.scope() as outer:
+        with UnitOfWork.scope(join=True) as inner:
+            assert inner is outer
+            inner.on_commit(lambda: done.append(True))
+        assert done == []
+    assert done == [True]
+
+
+def get(application, path, query, client):
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', 'QUERY_STRING': query,
+               'REMOTE_ADDR': client}
+    application(environ, lambda code, headers: None)
+
+
+def test_create_clinic_takes_location_from_form(workdir):
+    from urls import fronts
+    from views import routes, site
+
+    application = Framework(routes, fronts, UnitOfWork)
+    first = site.add_location('Первый')
+    second = site.add_location('Второй')
+    # оба пользователя открыли форму, затем оба её отправили
+    get(application, '/create-clinic/', f'id={first.id}', '10.0.2.1')
+    get(application, '/create-clinic/', f'id={second.id}', '10.0.2.2')
+    for location, client in ((first, '10.0.2.1'), (second, '10.0.2.2')):
+        body = f'location_id={location.id}&name=clinic_{location.id}'.encode()
+        assert post(application, '/create-clinic/', body, client) == '200 OK'
+    assert [clinic.name for clinic in first.clinics] == [f'clinic_{first.id}']
+    assert [clinic.name for clinic in second.clinics] == [f'clinic_{second.id}']
@@ -1,8 +1,22 @@
 from datetime import date
 
+from e_framework.admission import TokenBucket, TooManyRequests
+from e_framework.middleware import Front
 
+
+@Front(routes=['/visit-programs/'], methods=['GET'])
 def data_front(request):
     request.update({'date': date.today()})
 
 
-fronts = [data_front]
+rate_limiter = TokenBucket(rate=10, capacity=20)
+
+
+@Front(methods=['POST'])
+def rate_limit_front(request):
+    retry_after = rate_limiter.consume(request['client'])
+    if retry_after:
+        raise TooManyRequests(retry_after)
+
+
+fronts = [rate_limit_front, data_front]
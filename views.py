@@ -1,8 +1,8 @@
 from datetime import date
 
-from e_framework.templator import render
+from e_framework.templator import invalidate, render
 from patterns.architectural_system_pattern_unit_of_work import UnitOfWork
-from patterns.creational_patterns import Engine, Logger, MapperRegistry
+from patterns.creational_patterns import ClinicFactory, Engine, Logger, MapperRegistry
 from patterns.structural_patterns import AppRoute, Debug
 from patterns.behavioral_patterns import (EmailNotifier,
                                           SmsNotifier,
@@ -14,8 +14,10 @@ site = Engine()
 logger = Logger('main')
 email_notifier = EmailNotifier()
 sms_notifier = SmsNotifier()
-UnitOfWork.new_current()
-UnitOfWork.get_current().set_mapper_registry(MapperRegistry)
+for clinic_type in ClinicFactory.types.values():
+    clinic_type.attach(email_notifier)
+    clinic_type.attach(sms_notifier)
+UnitOfWork.set_default_mapper_registry(MapperRegistry)
 
 routes = {}
 
@@ -52,37 +54,35 @@ class VisitPrograms:
 
     @Debug(name='VisitPrograms')
     def __call__(self, request):
-        return '200 OK', render('visit_programs.html', data=date.today())
+        return '200 OK', render('visit_programs.html', data=request.get('date', date.today()))
 
 
 @AppRoute(routes=routes, url='/create-clinic/')
 class CreateClinic:
     """Контроллер: Создание клиники."""
 
-    location_id = -1
-
     @Debug(name='CreateClinic')
     def __call__(self, request):
         if request['method'] == 'POST':
             data = request['data']
 
-            name = site.decode_value(data['name'])
+            name = data['name']
 
-            location = None
-            if self.location_id != -1:
-                location = site.find_location_by_id(int(self.location_id))
+            # id района приходит из формы: экземпляр view общий для всех
+            # потоков, и хранить в нём состояние между запросами нельзя
+            try:
+                location = site.find_location_by_id(int(data['location_id']))
+            except (KeyError, ValueError):
+                return '200 OK', 'Район не выбран.'
 
-                clinic = site.create_clinic('state', name, location)
-                clinic.observers.append(email_notifier)
-                clinic.observers.append(sms_notifier)
-                site.clinics.append(clinic)
+            site.add_clinic('state', name, location)
+            invalidate('clinics', 'locations')
 
             return '200 OK', render('clinics_list.html', objects_list=location.clinics,
                                     name=location.name, id=location.id)
         else:
             try:
-                self.location_id = int(request['request_params']['id'])
-                location = site.find_location_by_id(int(self.location_id))
+                location = site.find_location_by_id(int(request['request_params']['id']))
 
                 return '200 OK', render('create_clinic.html', name=location.name, id=location.id)
             except KeyError:
@@ -98,15 +98,11 @@ class CreateLocation:
         if request['method'] == 'POST':
             data = request['data']
 
-            name = site.decode_value(data['name'])
+            name = data['name']
             location_id = data.get('location_id')
 
-            location = None
-            if location_id:
-                location = site.find_location_by_id(int(location_id))
-
-            new_location = site.create_location(name, location)
-            site.locations.append(new_location)
+            site.add_location(name, int(location_id) if location_id else None)
+            invalidate('locations')
 
             return '200 OK', render('index.html', objects_list=site.locations)
         else:
@@ -148,13 +144,9 @@ class CopyClinic:
         request_params = request['request_params']
 
         try:
-            name = site.decode_value(request_params['name'])
-            old_clinic = site.get_clinic(name)
-            if old_clinic:
-                new_name = f'copy_{name}'
-                new_clinic = old_clinic.clone()
-                new_clinic.name = new_name
-                site.clinics.append(new_clinic)
+            name = request_params['name']
+            if site.copy_clinic(name):
+                invalidate('clinics', 'locations')
 
             return '200 OK', render('clinics_list.html', objects_list=site.clinics)
         except KeyError:
@@ -176,11 +168,17 @@ class PatientCreateView(CreateView):
 
     def create_obj(self, data: dict):
         name = data['name']
-        name = site.decode_value(name)
         new_obj = site.create_user('patient', name)
-        site.patients.append(new_obj)
-        new_obj.mark_new()
-        UnitOfWork.get_current().commit()
+        # без UnitOfWork уровня Framework (DebugApplication, FakeApplication)
+        # view открывает свой и фиксирует его сам
+        with UnitOfWork.scope(join=True) as unit_of_work:
+            new_obj.mark_new()
+            # в Engine и журнал пациент попадает только после записи в БД
+            unit_of_work.on_commit(lambda: self.add_to_site(new_obj))
+
+    @staticmethod
+    def add_to_site(patient):
+        site.add_patient(patient.name, patient)
 
 
 @AppRoute(routes=routes, url='/add-patient/')
@@ -195,15 +193,15 @@ class AddPatientToVisitCreateView(CreateView):
 
     def create_obj(self, data: dict):
         print(data)
-        clinic_name = site.decode_value(data['clinic_name'])
+        clinic_name = data['clinic_name']
         clinic = site.get_clinic(clinic_name)
-        patient_name = site.decode_value(data['patient_name'])
+        patient_name = data['patient_name']
         patient = site.get_patient(patient_name)
-        clinic.add_patient(patient)
+        site.add_patient_to_clinic(clinic, patient)
 
 
 @AppRoute(routes=routes, url='/api/')
 class CourseApi:
     @Debug(name='CourseApi')
     def __call__(self, request):
-        return '200 OK', BaseSerializer(site.clinics).save()
+        return '200 OK', BaseSerializer(site.clinics).save(), 'application/json'